@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+"""
+Open the connections to the RabbitMQ nodes
+"""
+
+import ssl
+import pika
+import constants
+
+
+def tls_connector(username: str, password: str, connection_attempts: int = 3, retry_delay: float = 2):
+    """
+    Return a function opening a TLS connection to a node of the cluster,
+    from its index in constants.RABBITMQ_NODES
+
+    :param username: The RabbitMQ username
+    :param password: The RabbitMQ password
+    :param connection_attempts: The attempts on a node before giving up on it
+    :param retry_delay: Seconds between two attempts
+    """
+    def connect(node: int):
+        # TLS setup
+        context = ssl.create_default_context(cafile=constants.CA_CERT_FILE)
+        context.load_cert_chain(constants.CLIENT_CERT_FILE,
+                                constants.CLIENT_KEY_FILE)
+        host, port = constants.RABBITMQ_NODES[node]
+        params = pika.ConnectionParameters(
+            host=host,
+            port=port,
+            virtual_host=constants.RABBITMQ_VHOST,
+            credentials=pika.PlainCredentials(username, password),
+            ssl_options=pika.SSLOptions(context),
+            connection_attempts=connection_attempts,
+            retry_delay=retry_delay
+        )
+        return pika.BlockingConnection(params)
+    return connect
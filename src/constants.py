@@ -5,6 +5,8 @@ RABBITMQ_NODES = [
     ("localhost", 5671),   # node-1
     ("localhost", 5673),   # node-2
 ]
+# Docker containers of the nodes, in the same order (used by the load tests)
+RABBITMQ_CONTAINERS = ["rabbit1", "rabbit2"]
 # Virtual host
 RABBITMQ_VHOST = 'news'
 
@@ -37,4 +39,14 @@ NEWS_TYPES = [
 # Priority levels
 PRIORITY_LOW = 'low'
 PRIORITY_MEDIUM = 'medium'
-PRIORITY_HIGH = 'high'
\ No newline at end of file
+PRIORITY_HIGH = 'high'
+
+# Unix socket of the local relay shared by the subscribers of the host
+RELAY_SOCKET_PATH = "/tmp/news_relay.sock"
+
+# Directory of the subscribers state snapshots
+SNAPSHOT_DIR = "./snapshots"
+# Seconds between two saves of a subscriber state
+SNAPSHOT_INTERVAL = 5
+# News of each priority kept in a subscriber snapshot
+SNAPSHOT_MAX_MESSAGES = 100
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+"""
+Load tests of the news system: real editors and subscribers driven with
+synthetic news, and the statistics of a run
+"""
+
+import logging
+import math
+import random
+import subprocess
+import threading
+import time
+import constants
+from publisher import Editor
+from subscriber import Subscriber
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Return the percentile of sorted values (nearest rank)
+    """
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Stats:
+    """
+    Counters shared by the simulated clients
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._lock = threading.Lock()
+        self.published = 0  # news published by the editors
+        self.announcements = 0  # online/offline announcements published by the editors
+        self.expected = 0  # deliveries expected from the subscriptions
+        self.delivered = 0  # messages received by the subscribers
+        self.latencies = []  # end-to-end latency of each delivery, in seconds
+        self.reconnections = 0  # reconnections of the clients after a connection loss
+        self.kills = []  # time of each node kill
+        self.recoveries = []  # (kill time, time of the first delivery after reconnecting)
+
+    def add_published(self, expected: int, announcement: bool = False):
+        """
+        Count a published message and the deliveries it should lead to
+        """
+        with self._lock:
+            if announcement:
+                self.announcements += 1
+            else:
+                self.published += 1
+            self.expected += expected
+
+    def add_delivered(self, latency: float = None):
+        """
+        Count a delivered message and its latency, if known
+        """
+        with self._lock:
+            self.delivered += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def add_reconnection(self):
+        """
+        Count a reconnection after a connection loss
+        """
+        with self._lock:
+            self.reconnections += 1
+
+    def add_kill(self, at: float):
+        """
+        Record a node kill
+        """
+        with self._lock:
+            self.kills.append(at)
+
+    def add_recovery(self, at: float):
+        """
+        Record the first delivery of a subscriber after reconnecting,
+        matched with the last kill before it
+        """
+        with self._lock:
+            kills = [kill for kill in self.kills if kill <= at]
+            if kills:
+                self.recoveries.append((kills[-1], at))
+
+    def report(self, elapsed: float) -> str:
+        """
+        Return the summary of the run
+
+        :param elapsed: Duration of the publishing phase, in seconds
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+            recovery_times = sorted(at - kill for kill, at in self.recoveries)
+            lost = self.expected - self.delivered  # negative when more deliveries than expected
+            lines = [
+                f"Duration:        {elapsed:.1f} s",
+                f"Published:       {self.published} ({self.published / elapsed:.0f} msg/s)"
+                f" + {self.announcements} announcements",
+                f"Delivered:       {self.delivered} ({self.delivered / elapsed:.0f} msg/s)",
+                f"Lost:            {max(0, lost)} of {self.expected} expected"
+                f" ({100 * max(0, lost) / max(1, self.expected):.2f} %)",
+                "Latency (ms):    " + "  ".join(
+                    f"p{p}={1000 * percentile(latencies, p):.2f}" for p in (50, 95, 99)
+                ) + f"  max={1000 * (latencies[-1] if latencies else 0):.2f}",
+                f"Node kills:      {len(self.kills)}",
+                f"Reconnections:   {self.reconnections}",
+            ]
+            if lost < 0:
+                lines.insert(4, f"Unexpected:      {-lost} deliveries above the expected count")
+            if recovery_times:
+                lines.append(
+                    f"Recovery (ms):   p50={1000 * percentile(recovery_times, 50):.1f}"
+                    f"  max={1000 * recovery_times[-1]:.1f} ({len(recovery_times)} subscriber recoveries)"
+                )
+            return "\n".join(lines)
+
+
+class LoadEditor(Editor):
+    """
+    Editor publishing synthetic news on random categories at a given rate
+    """
+
+    def __init__(self, index: int, username, password, connect, stats: Stats, stop: threading.Event,
+                 categories: dict, subscribers: int, subscribers_per_category: dict, size: int, rate: float):
+        """
+        Constructor
+
+        :param index: The index of the editor
+        :param connect: Function opening a connection to a node from its index. TLS connection if None
+        :param stats: The shared counters
+        :param stop: Event set to stop the editor
+        :param categories: Map of the news types to their weight in the mix
+        :param subscribers: The number of subscribers, all receiving the announcements
+        :param subscribers_per_category: Map of the news types to the number of subscribers to it
+        :param size: The message size, in bytes
+        :param rate: The messages per second to publish. As fast as possible if 0
+        """
+        super(LoadEditor, self).__init__(f"LoadEditor{index}", username, password,
+                                         connect=connect, on_sent=self.__on_sent)
+        self.name = f"LoadEditor{index}"
+        self.daemon = True
+        self.stats = stats
+        self.stop = stop
+        self.types = list(categories)
+        self.weights = list(categories.values())
+        self.subscribers = subscribers
+        self.subscribers_per_category = subscribers_per_category
+        self.size = size
+        self.rate = rate
+        self._next_send = None  # time of the next news, when the rate is limited
+        self._last_connection = None  # connection of the last message sent
+
+    def read_news(self):
+        """
+        Return the next synthetic news, or stop the editor
+        """
+        if self.stop.is_set():
+            self.running = False
+            return [], ""
+        if self.rate > 0:
+            if self._next_send is None:
+                self._next_send = time.perf_counter()
+            self._next_send += 1 / self.rate
+            time.sleep(max(0.0, self._next_send - time.perf_counter()))
+        type_ = random.choices(self.types, self.weights)[0]
+        # The send time is the first word of the content, padded to the message size
+        return [type_], f"{time.perf_counter():.6f} ".ljust(self.size, ".")
+
+    def __on_sent(self, exchange: str, routing_key: str, content: str):
+        """
+        Count the deliveries expected for a message sent
+        """
+        if self.connection is not self._last_connection:
+            if self._last_connection is not None:
+                self.stats.add_reconnection()
+            self._last_connection = self.connection
+        if exchange == constants.EDITORS_EXCHANGE_NAME:
+            self.stats.add_published(self.subscribers, announcement=True)
+        else:
+            self.stats.add_published(self.subscribers_per_category[routing_key.split('.')[1]])
+
+
+class LoadSubscriber(Subscriber):
+    """
+    Subscriber measuring the latency of the news it receives
+    """
+
+    def __init__(self, index: int, username, password, connect, stats: Stats, types: list,
+                 relay_path=None, snapshot_path=None):
+        """
+        Constructor
+
+        :param index: The index of the subscriber
+        :param connect: Function opening a connection to a node from its index. TLS connection if None
+        :param stats: The shared counters
+        :param types: The news types to subscribe to
+        :param relay_path: Unix socket of the local relay. Connect directly to the broker if None
+        :param snapshot_path: File where the state is saved. No snapshot if None
+        """
+        super(LoadSubscriber, self).__init__(username, password, relay_path=relay_path,
+                                             snapshot_path=snapshot_path, connect=connect,
+                                             interactive=False, on_news=self.__on_news)
+        self.name = f"LoadSubscriber{index}"
+        self.daemon = True
+        self.stats = stats
+        self._last_connection = None  # connection of the last news received
+        self.routing_keys = [""] + [f"*.{type_}.#" for type_ in types]  # editors announcements and news types
+        for type_ in types:
+            self.handle_command(f"subscribe {type_}")
+
+    def is_ready(self) -> bool:
+        """
+        Return True once the subscriber holds all its subscriptions
+        """
+        return all(routing in self.map_news_routing_priory for routing in self.routing_keys)
+
+    def __on_news(self, exchange: str, routing_key: str, message: str):
+        """
+        Record the latency of a news, and the recovery after a reconnection
+        """
+        now = time.perf_counter()
+        if exchange == constants.NEWS_EXCHANGE_NAME:
+            self.stats.add_delivered(now - float(message.split(" ", 1)[0]))
+        else:
+            self.stats.add_delivered()
+        if self.connection is not self._last_connection:
+            if self._last_connection is not None:
+                self.stats.add_reconnection()
+                self.stats.add_recovery(now)
+            self._last_connection = self.connection
+
+
+class NodeKiller(threading.Thread):
+    """
+    Kill the nodes in turn at a regular interval and restart them after a while
+    """
+
+    def __init__(self, kill, restart, nodes: int, first: float, every: float, down_time: float,
+                 stats: Stats, stop: threading.Event):
+        """
+        Constructor
+
+        :param kill: Function killing a node from its index
+        :param restart: Function starting a node from its index
+        :param nodes: The number of nodes
+        :param first: Seconds before the first kill
+        :param every: Seconds between two kills. Only one kill if 0
+        :param down_time: Seconds before restarting a killed node
+        """
+        super(NodeKiller, self).__init__(daemon=True, name="NodeKiller")
+        self.kill = kill
+        self.restart = restart
+        self.nodes = nodes
+        self.first = first
+        self.every = every
+        self.down_time = down_time
+        self.stats = stats
+        self.stop = stop
+
+    def run(self):
+        """
+        Kill and restart the nodes until stopped
+        """
+        node = 0
+        if self.stop.wait(self.first):
+            return
+        while True:
+            logging.warning(f"💥 Killing node {node}")
+            self.stats.add_kill(time.perf_counter())
+            self.kill(node)
+            self.stop.wait(self.down_time)  # restart even when stopping
+            logging.warning(f"🔌 Restarting node {node}")
+            self.restart(node)
+            node = (node + 1) % self.nodes
+            if self.every <= 0 or self.stop.wait(max(0.0, self.every - self.down_time)):
+                return
+
+
+def docker_node(action: str):
+    """
+    Return a function killing or starting a container of the real cluster.
+    "docker kill" sends SIGKILL, like a crash, without the grace period of "docker stop".
+
+    :param action: "kill" or "start"
+    """
+    def run(node: int):
+        subprocess.run(["docker", action, constants.RABBITMQ_CONTAINERS[node]],
+                       check=False, stdout=subprocess.DEVNULL)
+    return run
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+import argparse
+import getpass
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+from loadtest import LoadEditor, LoadSubscriber, NodeKiller, Stats, docker_node
+from local_broker import LocalBroker
+from relay import Relay
+import constants
+
+# Max seconds for the subscribers to connect and bind before the editors start
+READY_TIMEOUT = 60
+
+def parse_mix(text: str) -> dict:
+    """
+    Parse a category mix such as "sports=5,weather=1" into a map of weights
+    """
+    categories = {}
+    for item in text.split(","):
+        type_, _, weight = item.partition("=")
+        if type_ not in constants.NEWS_TYPES:
+            raise argparse.ArgumentTypeError(f"invalid news type: {type_}")
+        categories[type_] = float(weight or 1)
+    return categories
+
+def main():
+    """
+    Main program entry point.
+    """
+    parser = argparse.ArgumentParser(description="Load and fail-over test of the news system.")
+    parser.add_argument("--local", action="store_true",
+                        help="use the in-process broker instead of the docker cluster")
+    parser.add_argument("--editors", type=int, default=2, help="number of editors (default: 2)")
+    parser.add_argument("--subscribers", type=int, default=10, help="number of subscribers (default: 10)")
+    parser.add_argument("--mix", type=parse_mix, default=",".join(constants.NEWS_TYPES),
+                        help='news types and weights, e.g. "sports=5,weather=1" (default: all, same weight)')
+    parser.add_argument("--subscriptions", type=int, default=2,
+                        help="news types subscribed by each subscriber (default: 2)")
+    parser.add_argument("--size", type=int, default=256, help="message size in bytes (default: 256)")
+    parser.add_argument("--rate", type=float, default=100,
+                        help="messages per second per editor, 0 for as fast as possible (default: 100)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of publishing (default: 30)")
+    parser.add_argument("--kill-after", type=float, default=0,
+                        help="seconds before killing a node, 0 for no kill (default: 0)")
+    parser.add_argument("--kill-every", type=float, default=0,
+                        help="seconds between two kills, the nodes are killed in turn (default: one kill)")
+    parser.add_argument("--down-time", type=float, default=5,
+                        help="seconds before restarting a killed node (default: 5)")
+    parser.add_argument("--relay", action="store_true",
+                        help="connect the subscribers through a local relay (recovery is then not measured)")
+    parser.add_argument("--snapshots", metavar="DIR",
+                        help="save the state of each subscriber in this new or empty directory (default: no snapshot)")
+    args = parser.parse_args()
+    # Subscriptions restored from a previous run would not be counted in the expected deliveries
+    if args.snapshots and os.path.isdir(args.snapshots) and os.listdir(args.snapshots):
+        parser.error(f"--snapshots: {args.snapshots} must be a new or empty directory")
+
+    # Editors and subscribers log every message: only show the problems
+    logging.basicConfig(stream=sys.stderr,
+                        level=logging.WARNING,
+                        format="[%(levelname)s] %(threadName)s \t\t %(message)s")
+    logging.getLogger("pika").setLevel(logging.CRITICAL)
+
+    # 1) Broker: in-process stand-in or real cluster
+    nodes = len(constants.RABBITMQ_NODES)
+    editor_user = editor_password = subscriber_user = subscriber_password = None
+    if args.local:
+        broker = LocalBroker(nodes)
+        connect = broker.connect
+        kill, restart = broker.kill, broker.restart
+    else:
+        editor_user = input("Enter the editors RabbitMQ username: ").strip()
+        editor_password = getpass.getpass("Enter the editors RabbitMQ password: ")
+        subscriber_user = input("Enter the subscribers RabbitMQ username: ").strip()
+        subscriber_password = getpass.getpass("Enter the subscribers RabbitMQ password: ")
+        connect = None  # TLS connections of the clients
+        kill, restart = docker_node("kill"), docker_node("start")
+
+    # 2) Subscriptions of each subscriber, drawn from the mix
+    types = list(args.mix)
+    subscriptions = [random.sample(types, min(args.subscriptions, len(types)))
+                     for _ in range(args.subscribers)]
+    subscribers_per_category = {type_: sum(type_ in s for s in subscriptions) for type_ in types}
+
+    # 3) Relay (optional) and subscribers first, so that they do not miss the first news
+    relay = None
+    relay_path = None
+    if args.relay:
+        relay_path = f"/tmp/news_loadtest_{os.getpid()}.sock"
+        relay = Relay(subscriber_user, subscriber_password, socket_path=relay_path, connect=connect)
+        relay.name = "Relay"
+        relay.daemon = True
+        relay.start()
+        while relay.is_alive() and not os.path.exists(relay_path):
+            time.sleep(0.1)
+
+    stats = Stats()
+    stop_editors = threading.Event()
+    subscribers = [LoadSubscriber(i, subscriber_user, subscriber_password, connect, stats, subscriptions[i],
+                                  relay_path=relay_path,
+                                  snapshot_path=os.path.join(args.snapshots, f"LoadSubscriber{i}.snap")
+                                  if args.snapshots else None)
+                   for i in range(args.subscribers)]
+    for subscriber in subscribers:
+        subscriber.start()
+
+    # Start the clock only once every binding is in place, otherwise the news sent before are counted as lost
+    relay_bindings = {(constants.EDITORS_EXCHANGE_NAME, ""): args.subscribers}
+    relay_bindings.update({(constants.NEWS_EXCHANGE_NAME, f"*.{type_}.#"): count
+                           for type_, count in subscribers_per_category.items() if count})
+    deadline = time.monotonic() + READY_TIMEOUT
+    while not (all(subscriber.is_ready() for subscriber in subscribers)
+               and (relay is None or all(relay.bindings.get(binding, 0) == count
+                                         for binding, count in relay_bindings.items()))):
+        dead = [subscriber.name for subscriber in subscribers if not subscriber.is_alive()]
+        if relay is not None and not relay.is_alive():
+            dead.append(relay.name)
+        if dead:
+            print(f"❌ {', '.join(dead)} stopped before subscribing (see the errors above).")
+            sys.exit(1)
+        if time.monotonic() > deadline:
+            print(f"❌ The subscribers are not subscribed after {READY_TIMEOUT} s.")
+            sys.exit(1)
+        time.sleep(0.1)
+
+    editors = [LoadEditor(i, editor_user, editor_password, connect, stats, stop_editors, args.mix,
+                          args.subscribers, subscribers_per_category, args.size, args.rate)
+               for i in range(args.editors)]
+    start = time.perf_counter()
+    for editor in editors:
+        editor.start()
+    killer = None
+    if args.kill_after > 0:
+        killer = NodeKiller(kill, restart, nodes, args.kill_after, args.kill_every, args.down_time,
+                            stats, stop_editors)
+        killer.start()
+
+    # 4) Publish for the duration, then let the subscribers drain their queues
+    try:
+        time.sleep(args.duration)
+    except KeyboardInterrupt:
+        pass
+    stop_editors.set()
+    elapsed = time.perf_counter() - start
+    for editor in editors:
+        editor.join()
+    if killer is not None:
+        killer.join()                    # the killed node is always restarted
+    time.sleep(2)
+    for subscriber in subscribers:
+        subscriber.exit()
+    for subscriber in subscribers:
+        subscriber.join()
+    if relay is not None:
+        relay.exit()
+        relay.join()
+
+    print(stats.report(elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+"""
+In-process stand-in for the RabbitMQ cluster, to run the load tests without docker
+"""
+
+import itertools
+import threading
+from collections import deque
+from types import SimpleNamespace
+import pika.exceptions
+import constants
+from routing import matches_pattern
+
+
+class LocalBroker:
+    """
+    A broker with topic and fanout exchanges, spread over simulated nodes that
+    can be killed and restarted. Exchanges and bindings are shared by all the
+    nodes; queues live as long as the connection which declared them, like the
+    exclusive queues of the subscribers.
+    """
+
+    def __init__(self, nodes: int = len(constants.RABBITMQ_NODES)):
+        """
+        Constructor
+
+        :param nodes: The number of simulated nodes
+        """
+        self._lock = threading.Lock()
+        self.nodes_up = [True] * nodes  # state of each node
+        self.exchanges = {}  # map of the exchange names to their type
+        self.bindings = {}  # map of the exchange names to their (queue, routing) bindings
+        self.queues = {}  # map of the queue names to the connection consuming them
+        self.connections = set()  # open connections
+        self._queue_ids = itertools.count(1)
+
+    def connect(self, node: int) -> "LocalConnection":
+        """
+        Open a connection on a node
+
+        :param node: The index of the node
+        """
+        with self._lock:
+            if not self.nodes_up[node]:
+                raise pika.exceptions.AMQPConnectionError(f"node {node} is down")
+            connection = LocalConnection(self, node)
+            self.connections.add(connection)
+            return connection
+
+    def kill(self, node: int):
+        """
+        Stop a node: its connections are closed and their queues deleted
+        """
+        with self._lock:
+            self.nodes_up[node] = False
+            for connection in [c for c in self.connections if c.node == node]:
+                self._drop(connection)
+
+    def restart(self, node: int):
+        """
+        Start a node again
+        """
+        with self._lock:
+            self.nodes_up[node] = True
+
+    def close(self, connection: "LocalConnection"):
+        """
+        Close a connection and delete its queues
+        """
+        with self._lock:
+            self._drop(connection)
+
+    def _drop(self, connection: "LocalConnection"):
+        """
+        Close a connection and delete its queues. The lock must be held.
+        """
+        self.connections.discard(connection)
+        for queue_name in [q for q, c in self.queues.items() if c is connection]:
+            del self.queues[queue_name]
+            for exchange, bindings in self.bindings.items():
+                self.bindings[exchange] = [b for b in bindings if b[0] != queue_name]
+        connection._close()
+
+    def declare_exchange(self, exchange: str, exchange_type: str):
+        """
+        Declare an exchange, if not declared yet
+        """
+        with self._lock:
+            self.exchanges.setdefault(exchange, exchange_type)
+            self.bindings.setdefault(exchange, [])
+
+    def declare_queue(self, connection: "LocalConnection", queue_name: str) -> str:
+        """
+        Declare a queue consumed by the connection. A name is generated if empty.
+        """
+        with self._lock:
+            if not queue_name:
+                queue_name = f"amq.gen-{next(self._queue_ids)}"
+            self.queues[queue_name] = connection
+            return queue_name
+
+    def bind(self, exchange: str, queue_name: str, routing_key: str):
+        """
+        Bind a queue to an exchange
+        """
+        with self._lock:
+            self.__check_exchange(exchange)
+            if (queue_name, routing_key) not in self.bindings[exchange]:
+                self.bindings[exchange].append((queue_name, routing_key))
+
+    def unbind(self, exchange: str, queue_name: str, routing_key: str):
+        """
+        Unbind a queue from an exchange
+        """
+        with self._lock:
+            self.__check_exchange(exchange)
+            if (queue_name, routing_key) in self.bindings[exchange]:
+                self.bindings[exchange].remove((queue_name, routing_key))
+
+    def publish(self, exchange: str, routing_key: str, body: bytes):
+        """
+        Route a message to the queues bound to the exchange. A queue bound
+        several times to the exchange receives the message once.
+        """
+        with self._lock:
+            self.__check_exchange(exchange)
+            exchange_type = self.exchanges[exchange]
+            routed = set()
+            for queue_name, pattern in self.bindings[exchange]:
+                if queue_name not in routed and matches_pattern(pattern, routing_key, exchange_type):
+                    routed.add(queue_name)
+                    self.queues[queue_name]._deliver(queue_name, exchange, routing_key, body)
+
+    def __check_exchange(self, exchange: str):
+        """
+        Fail like RabbitMQ when the exchange is not declared. The lock must be held.
+        """
+        if exchange not in self.exchanges:
+            raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+
+
+class LocalConnection:
+    """
+    Connection to the local broker. Mimics the parts of pika's
+    BlockingConnection used by the clients.
+    """
+
+    def __init__(self, broker: LocalBroker, node: int):
+        """
+        Constructor
+        """
+        self.broker = broker
+        self.node = node
+        self.is_open = True
+        self._condition = threading.Condition()  # signals new messages and callbacks
+        self._inbox = deque()  # messages delivered and not consumed yet
+        self._callbacks = deque()  # callbacks added by other threads
+        self._consumers = {}  # map of the queue names to their on_message_callback
+        self._channel = LocalChannel(self)
+
+    def channel(self):
+        """
+        Return the channel of the connection
+        """
+        self.check_open()
+        return self._channel
+
+    def add_callback_threadsafe(self, callback):
+        """
+        Request a call to the callback from the connection thread
+        """
+        self.check_open()
+        with self._condition:
+            self._callbacks.append(callback)
+            self._condition.notify()
+
+    def process_data_events(self, time_limit=0):
+        """
+        Run the pending callbacks and dispatch the messages received
+
+        :param time_limit: Max time to wait for messages, in seconds
+        """
+        with self._condition:
+            if not self._inbox and not self._callbacks and self.is_open:
+                self._condition.wait(time_limit)
+            callbacks, self._callbacks = self._callbacks, deque()
+            inbox, self._inbox = self._inbox, deque()
+        self.check_open()
+        for callback in callbacks:
+            callback()
+        for queue_name, exchange, routing_key, body in inbox:
+            consumer = self._consumers.get(queue_name)
+            if consumer is not None:
+                method = SimpleNamespace(exchange=exchange, routing_key=routing_key)
+                consumer(self._channel, method, None, body)
+
+    def close(self):
+        """
+        Close the connection
+        """
+        if self.is_open:
+            self.broker.close(self)
+
+    def check_open(self):
+        """
+        Fail like pika when the connection was closed by the broker
+        """
+        if not self.is_open:
+            raise pika.exceptions.ConnectionClosed(320, "CONNECTION_FORCED - node stopped")
+
+    def _deliver(self, queue_name, exchange, routing_key, body):
+        """
+        Called by the broker to push a message to the connection
+        """
+        with self._condition:
+            self._inbox.append((queue_name, exchange, routing_key, body))
+            self._condition.notify()
+
+    def _close(self):
+        """
+        Called by the broker once the connection is closed
+        """
+        with self._condition:
+            self.is_open = False
+            self._inbox.clear()
+            self._condition.notify()
+
+
+class LocalChannel:
+    """
+    Channel of a connection to the local broker
+    """
+
+    def __init__(self, connection: LocalConnection):
+        """
+        Constructor
+        """
+        self.connection = connection
+        self.broker = connection.broker
+
+    def exchange_declare(self, exchange, exchange_type='direct', durable=False):
+        """
+        Declare an exchange
+        """
+        self.connection.check_open()
+        self.broker.declare_exchange(exchange, exchange_type)
+
+    def queue_declare(self, queue='', exclusive=False):
+        """
+        Declare a queue, deleted with the connection
+        """
+        self.connection.check_open()
+        queue_name = self.broker.declare_queue(self.connection, queue)
+        return SimpleNamespace(method=SimpleNamespace(queue=queue_name))
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False):
+        """
+        Register the callback called for each message of the queue
+        """
+        self.connection.check_open()
+        self.connection._consumers[queue] = on_message_callback
+
+    def queue_bind(self, queue, exchange, routing_key=None):
+        """
+        Bind a queue to an exchange
+        """
+        self.connection.check_open()
+        self.broker.bind(exchange, queue, routing_key or "")
+
+    def queue_unbind(self, queue, exchange, routing_key=None):
+        """
+        Unbind a queue from an exchange
+        """
+        self.connection.check_open()
+        self.broker.unbind(exchange, queue, routing_key or "")
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        """
+        Publish a message. A text body is encoded in UTF-8, like pika does.
+        """
+        self.connection.check_open()
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.broker.publish(exchange, routing_key, body)
@@ -7,9 +7,9 @@ Manage the news editor
 import logging
 import threading
 import pika
-import ssl
 from collections import deque
 import constants
+from connection import tls_connector
 
 for name in list(logging.root.manager.loggerDict):
     if name.startswith("pika"):
@@ -23,15 +23,20 @@ class Editor(threading.Thread):
     An editor can send news to the broker
     """
 
-    def __init__(self, editor_name, username, password):
+    def __init__(self, editor_name, username, password, connect=None, on_sent=None):
         """
         Constructor
+
+        :param connect: Function opening a connection to a node from its index. TLS connection if None
+        :param on_sent: Function called with the exchange, routing key and content of each message sent
         """
         super(Editor, self).__init__()  # execute super class constructor
         self.running = True  # flag to indicate if the editor is running
         self.editor_name = editor_name.replace(' ', '_') # retain the name for creating the editor-specific news
         self.username = username
         self.password = password
+        self.connect = connect if connect is not None else tls_connector(username, password)
+        self.on_sent = on_sent
         self._outbox = deque()
         
     def run(self):
@@ -48,11 +53,8 @@ class Editor(threading.Thread):
         # 2) Read/send loop
         while self.running:
             try:
-                types = input("Enter the news type(s) (space-separated): ").split()
-                if not types:
-                    continue
-                content = input("Enter the news content: ")
-                if not content:
+                types, content = self.read_news()
+                if not types or not content:
                     continue
 
                 for type_ in types:
@@ -71,31 +73,26 @@ class Editor(threading.Thread):
         # 3) Clean exit
         self.exit()
 
+    def read_news(self):
+        """
+        Read the next news to send from the user
+
+        :return: The news types and the content. Empty when nothing to send
+        """
+        types = input("Enter the news type(s) (space-separated): ").split()
+        if not types:
+            return [], ""
+        return types, input("Enter the news content: ")
+
     def __connect(self):
         """
         Connect to the broker using TLS and authentication, with automatic fail-over.
         """
-        # 1) Build SSL context
-        context = ssl.create_default_context(cafile=constants.CA_CERT_FILE)
-        context.load_cert_chain(constants.CLIENT_CERT_FILE, constants.CLIENT_KEY_FILE)
-
-        # 2) Credentials
-        credentials = pika.PlainCredentials(self.username, self.password)
-
-        # 3) Try each node in turn
+        # 1) Try each node in turn
         last_exc = None
-        for host, port in constants.RABBITMQ_NODES:
+        for node, (host, port) in enumerate(constants.RABBITMQ_NODES):
             try:
-                params = pika.ConnectionParameters(
-                    host=host,
-                    port=port,
-                    virtual_host=constants.RABBITMQ_VHOST,
-                    credentials=credentials,
-                    ssl_options=pika.SSLOptions(context),
-                    connection_attempts=3,
-                    retry_delay=2
-                )
-                self.connection = pika.BlockingConnection(params)
+                self.connection = self.connect(node)
                 self.channel = self.connection.channel()
                 logging.info(f"✅ Publisher connected to {host}:{port}")
                 break
@@ -110,7 +107,7 @@ class Editor(threading.Thread):
             logging.critical("❌  No RabbitMQ node reachable – giving up.")
             raise SystemExit(1)
 
-        # 4) Declare your exchanges
+        # 2) Declare your exchanges
         self.channel.exchange_declare(
             exchange=constants.EDITORS_EXCHANGE_NAME,
             exchange_type='fanout',
@@ -122,12 +119,12 @@ class Editor(threading.Thread):
             durable=True
         )
 
-        # 5) Announce this editor is online
+        # 3) Announce this editor is online
         self.__send_to_subscribers(
             constants.EDITORS_EXCHANGE_NAME,
             f'Editor "{self.name}" is online.'
         )
-        # 6) If messages were queued during an outage, send them now
+        # 4) If messages were queued during an outage, send them now
         self.__flush_outbox()
 
     def __send_to_subscribers(self, exchange: str, content: str, routing: str = ""):
@@ -187,6 +184,8 @@ class Editor(threading.Thread):
                     properties=pika.BasicProperties(delivery_mode=2)  # persistent
                 )
                 self._outbox.popleft()              # success → drop
+                if self.on_sent is not None:
+                    self.on_sent(exch, rk, body)
             except (pika.exceptions.AMQPError, OSError):
                 # Connection died again → reconnect and retry remaining msgs
                 self.__connect()
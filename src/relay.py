@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+
+"""
+Manage the local news relay: one broker connection shared by all the
+subscribers of the host through a Unix socket
+"""
+
+import logging
+import threading
+import queue
+import time
+import os
+import select
+import selectors
+import socket
+import struct
+from collections import deque
+from types import SimpleNamespace
+import pika
+import pika.exceptions
+import constants
+from connection import tls_connector
+from routing import matches_pattern
+
+for name in list(logging.root.manager.loggerDict):
+    if name.startswith("pika"):
+        pika_log = logging.getLogger(name)
+        pika_log.setLevel(logging.CRITICAL)
+        # 2) remove any handler Pika attached (prints regardless of level)
+        pika_log.handlers.clear()
+
+# Header of a news frame: exchange length, routing key length, body length
+FRAME_HEADER = struct.Struct("!BHI")
+# Max time to write a frame to a local subscriber before dropping it
+SEND_TIMEOUT = 1.0
+# Socket send buffer of each local subscriber: room for several large frames, so
+# the connection thread rarely waits for a subscriber to read
+SEND_BUFFER_SIZE = 4 << 20
+# Max bytes read from the relay socket at once by a local subscriber
+RECV_SIZE = 1 << 20
+
+
+def encode_frame(exchange: str, routing_key: str, body: bytes) -> bytes:
+    """
+    Encode a news as a frame sent by the relay to the local subscribers
+
+    :param exchange: The exchange the news was received on
+    :param routing_key: The routing key of the news
+    :param body: The message body
+    """
+    exchange_bytes = exchange.encode('utf-8')
+    routing_bytes = routing_key.encode('utf-8')
+    header = FRAME_HEADER.pack(len(exchange_bytes), len(routing_bytes), len(body))
+    return b"".join((header, exchange_bytes, routing_bytes, body))
+
+
+class Relay(threading.Thread):
+    """
+    A relay consumes the news once from the broker, with the union of the
+    subscriptions of the local subscribers, and fans them out over a Unix socket
+    """
+
+    EXCHANGE_TYPES = {
+        constants.EDITORS_EXCHANGE_NAME: 'fanout',
+        constants.NEWS_EXCHANGE_NAME: 'topic',
+    }
+
+    def __init__(self, username, password, socket_path=constants.RELAY_SOCKET_PATH, connect=None):
+        """
+        Constructor
+
+        :param connect: Function opening a connection to a node from its index. TLS connection if None
+        """
+        super(Relay, self).__init__()  # execute super class constructor
+        self.username = username
+        self.password = password
+        self.connect = connect if connect is not None else tls_connector(username, password)
+        self.socket_path = socket_path
+        self.running = True  # flag to indicate if the relay is running
+        self.queue_name = None  # name of the queue. Defined later
+        self.clients = {}  # map of the local subscribers sockets to their bindings
+        self.bindings = {}  # map of the bindings (exchange, routing) to the number of subscribers using it
+        self._commands = queue.SimpleQueue()  # commands sent by the socket thread to the connection thread
+        self._pending_commands = deque()  # commands taken from the queue but not applied yet
+
+    # ──────────────────────────────────────────────────────────
+    # main thread life-cycle
+    # ──────────────────────────────────────────────────────────
+    def run(self):
+        """
+        Handle the lifecycle of the relay
+        """
+        # 1) Connect to the broker
+        try:
+            self.__connect()
+        except ConnectionError as err:
+            logging.error(err)
+            logging.error("❌ Authentication failed — relay will exit.")
+            return
+
+        # 2) Open the local socket
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # left over by a previous relay
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen()
+        logging.info(f"📡 Relay listening on {self.socket_path}")
+
+        # 3) Serve the local subscribers in a helper thread
+        clients_thread = threading.Thread(target=self.__serve_clients,
+                                          daemon=True,
+                                          name="RelayClients")
+        clients_thread.start()
+
+        # 4) Enter the main receive loop
+        self.__wait_for_news()
+
+    def __connect(self):
+        """
+        Connect to broker with TLS, authenticate, declare exchanges,
+        declare queue and (re)bind the subscriptions of the local subscribers.
+        """
+        last_exc = None
+        for node, (host, port) in enumerate(constants.RABBITMQ_NODES):
+            try:
+                self.connection = self.connect(node)
+                self.channel = self.connection.channel()
+                logging.info(f"✅ Relay connected to RabbitMQ at {host}:{port}")
+
+                # Declare the two exchanges (fanout & topic)
+                for exchange, exchange_type in self.EXCHANGE_TYPES.items():
+                    self.channel.exchange_declare(
+                        exchange=exchange,
+                        exchange_type=exchange_type,
+                        durable=True
+                    )
+
+                # Declare exclusive, auto-delete queue and start consuming
+                qr = self.channel.queue_declare(queue='', exclusive=True)
+                self.queue_name = qr.method.queue
+                self.channel.basic_consume(
+                    queue=self.queue_name,
+                    on_message_callback=self.__callback,
+                    auto_ack=True
+                )
+                logging.info(f"Relay queue '{self.queue_name}' declared")
+
+                # Rebind the subscriptions of the local subscribers (on reconnect)
+                for exchange, routing in self.bindings:
+                    self.channel.queue_bind(exchange=exchange, queue=self.queue_name, routing_key=routing)
+                # Apply the commands received while the connection was down
+                self.__process_commands()
+                return
+
+            except Exception as e:
+                last_exc = e
+                # if it’s bad credentials, don’t show Pika’s tracebacks again
+                if isinstance(e, pika.exceptions.ProbableAuthenticationError):
+                    logging.error("❌ Wrong username or password.")
+                    raise ConnectionError("authentication failed")   # abort fast
+                logging.warning(f"⚠️ {host}:{port} unavailable ({e.__class__.__name__}); trying next…")
+
+        raise ConnectionError(f"❌ All connection attempts failed: {last_exc!r}")
+
+    def __wait_for_news(self):
+        """
+        Main loop: process events and handle forced shutdowns by reconnecting.
+        """
+        logging.info("🚀 Relaying news...")
+        while self.running:
+            try:
+                self.connection.process_data_events(time_limit=1)
+            except Exception as e:
+                logging.warning(f"⚠️ Lost connection ({e.__class__.__name__}) — reconnecting…")
+                try:
+                    self.__connect()
+                    logging.info("🔌 Reconnected to broker.")
+                except Exception:
+                    logging.warning("⚠️ Reconnect attempt failed; will retry shortly.")
+                    time.sleep(2)
+                    continue
+        self.connection.close()
+        self.server.close()
+        os.unlink(self.socket_path)
+
+    # ──────────────────────────────────────────────────────────
+    # local subscribers (socket thread)
+    # ──────────────────────────────────────────────────────────
+    def __serve_clients(self):
+        """
+        A thread that accepts the local subscribers and reads their commands:
+          - bind <exchange> <routing>
+          - unbind <exchange> <routing>
+        """
+        selector = selectors.DefaultSelector()
+        selector.register(self.server, selectors.EVENT_READ)
+        buffers = {}  # incomplete command lines of each local subscriber
+
+        while self.running:
+            for key, _ in selector.select(timeout=0.5):
+                if key.fileobj is self.server:
+                    client, _ = self.server.accept()
+                    client.settimeout(SEND_TIMEOUT)
+                    client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+                    selector.register(client, selectors.EVENT_READ)
+                    buffers[client] = b""
+                    self.__send_command("attach", client)
+                    continue
+
+                client = key.fileobj
+                try:
+                    data = client.recv(4096)
+                except OSError:
+                    data = b""
+                if not data:
+                    # Local subscriber left (or was dropped by the connection thread)
+                    selector.unregister(client)
+                    del buffers[client]
+                    self.__send_command("detach", client)
+                    continue
+
+                *lines, buffers[client] = (buffers[client] + data).split(b"\n")
+                for line in lines:
+                    try:
+                        args = line.decode('utf-8').split(" ", 2)
+                    except UnicodeDecodeError:
+                        args = []
+                    if len(args) != 3 or args[0] not in ("bind", "unbind") or args[1] not in self.EXCHANGE_TYPES:
+                        logging.error(f"⚡️ Invalid relay command: {line!r}")
+                        continue
+                    self.__send_command(args[0], client, args[1], args[2])
+
+    def __send_command(self, action: str, client: socket.socket, exchange: str = "", routing: str = ""):
+        """
+        Queue a command and wake up the connection thread to apply it.
+        Called from the socket thread only.
+
+        :param action: "attach", "detach", "bind" or "unbind"
+        :param client: The socket of the local subscriber
+        :param exchange: The exchange name of the binding
+        :param routing: The routing key of the binding
+        """
+        self._commands.put((action, client, exchange, routing))
+        try:
+            self.connection.add_callback_threadsafe(self.__process_commands)
+        except Exception as e:
+            # Connection is down: the command is applied after the reconnection
+            logging.debug(f"Relay command \"{action}\" deferred ({e.__class__.__name__}).")
+
+    # ──────────────────────────────────────────────────────────
+    # bindings (connection thread)
+    # ──────────────────────────────────────────────────────────
+    def __process_commands(self):
+        """
+        Apply the pending commands. Runs on the connection thread only, so the
+        channel, the clients and the bindings are never touched concurrently.
+        If the connection drops in the middle, the remaining commands stay
+        pending and are applied after the reconnection.
+        """
+        while True:
+            try:
+                self._pending_commands.append(self._commands.get_nowait())
+            except queue.Empty:
+                break
+
+        while self._pending_commands:
+            action, client, exchange, routing = self._pending_commands[0]  # peek
+            if action == "attach":
+                self.clients[client] = set()
+                logging.info(f"➕ Local subscriber attached ({len(self.clients)} attached).")
+            elif action == "detach":
+                self.__drop_client(client)
+                client.close()
+            elif client not in self.clients:
+                pass  # already dropped
+            elif action == "bind" and (exchange, routing) not in self.clients[client]:
+                self.__acquire_binding(exchange, routing)
+                self.clients[client].add((exchange, routing))
+            elif action == "unbind" and (exchange, routing) in self.clients[client]:
+                self.clients[client].remove((exchange, routing))
+                self.__release_binding(exchange, routing)
+            self._pending_commands.popleft()  # applied → drop
+
+    def __acquire_binding(self, exchange: str, routing: str):
+        """
+        Bind the queue to the exchange for the first local subscriber using it
+        """
+        if self.bindings.get((exchange, routing), 0) == 0:
+            self.channel.queue_bind(exchange=exchange, queue=self.queue_name, routing_key=routing)
+            logging.debug(f"Queue {self.queue_name} bound to exchange {exchange} with routing key {routing}.")
+        self.bindings[(exchange, routing)] = self.bindings.get((exchange, routing), 0) + 1
+
+    def __release_binding(self, exchange: str, routing: str):
+        """
+        Unbind the queue from the exchange once no local subscriber uses it
+        """
+        self.bindings[(exchange, routing)] -= 1
+        if self.bindings[(exchange, routing)] == 0:
+            del self.bindings[(exchange, routing)]
+            self.channel.queue_unbind(exchange=exchange, queue=self.queue_name, routing_key=routing)
+            logging.debug(f"Queue {self.queue_name} unbound from exchange {exchange} with routing key {routing}.")
+
+    def __drop_client(self, client: socket.socket):
+        """
+        Forget a local subscriber and release its bindings
+        """
+        if client not in self.clients:
+            return
+        for exchange, routing in self.clients.pop(client):
+            try:
+                self.__release_binding(exchange, routing)
+            except pika.exceptions.AMQPError:
+                pass  # connection lost: the binding is not restored on reconnect
+        logging.info(f"➖ Local subscriber detached ({len(self.clients)} attached).")
+
+    def __callback(self, ch, method, properties, body):
+        """
+        Callback function that is called when a new message is received.
+        The frame is encoded once and written to every local subscriber
+        with a matching binding.
+
+        :param ch: The channel
+        :param method: The method frame
+        :param properties: The properties frame
+        :param body: The message body
+        """
+        exchange_type = self.EXCHANGE_TYPES.get(method.exchange)
+        frame = encode_frame(method.exchange, method.routing_key, body)
+        for client, bindings in list(self.clients.items()):
+            if not any(exchange == method.exchange and matches_pattern(routing, method.routing_key, exchange_type)
+                       for exchange, routing in bindings):
+                continue
+            try:
+                client.sendall(frame)
+            except OSError as e:
+                # Too slow or gone: drop it, the socket thread sees the shutdown and detaches it
+                logging.warning(f"⚠️ Dropping local subscriber ({e.__class__.__name__}).")
+                self.__drop_client(client)
+                try:
+                    client.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def exit(self):
+        """
+        Stop the relay
+        """
+        self.running = False
+        logging.info("Relay stopped.")
+
+
+class RelayConnection:
+    """
+    Connection of a local subscriber to the relay. Mimics the parts of pika's
+    BlockingConnection used by the subscriber, so it can use either of them.
+    """
+
+    def __init__(self, socket_path=constants.RELAY_SOCKET_PATH):
+        """
+        Constructor
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self._buffer = bytearray()  # received bytes not decoded yet
+        self._callbacks = queue.SimpleQueue()  # callbacks added by other threads
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()  # ends the wait for news on a callback
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._consumer = None  # on_message_callback of the channel
+        self._channel = RelayChannel(self)
+
+    def channel(self):
+        """
+        Return the channel of the connection
+        """
+        return self._channel
+
+    def add_callback_threadsafe(self, callback):
+        """
+        Request a call to the callback from the connection thread
+        """
+        self._callbacks.put(callback)
+        try:
+            self._wakeup_writer.send(b"\0")
+        except BlockingIOError:
+            pass  # a wake-up is already pending
+
+    def process_data_events(self, time_limit=0):
+        """
+        Run the pending callbacks and dispatch the news received from the relay.
+        The socket is read until empty, so the subscriber keeps up with the relay.
+
+        :param time_limit: Max time to wait for news, in seconds
+        """
+        self.__run_callbacks()
+        readable, _, _ = select.select([self.sock, self._wakeup_reader], [], [], time_limit)
+        if self._wakeup_reader in readable:
+            try:
+                while self._wakeup_reader.recv(4096):
+                    pass
+            except BlockingIOError:
+                pass
+        if self.sock in readable:
+            while True:
+                try:
+                    data = self.sock.recv(RECV_SIZE, socket.MSG_DONTWAIT)
+                except BlockingIOError:
+                    break
+                if not data:
+                    raise ConnectionError("relay closed the connection")
+                self._buffer += data
+                self.__dispatch_frames()
+        self.__run_callbacks()
+
+    def __run_callbacks(self):
+        """
+        Run the callbacks added by other threads
+        """
+        while True:
+            try:
+                self._callbacks.get_nowait()()
+            except queue.Empty:
+                break
+
+    def __dispatch_frames(self):
+        """
+        Dispatch every complete frame of the buffer to the consumer
+        """
+        view = memoryview(self._buffer)
+        offset = 0
+        while len(view) - offset >= FRAME_HEADER.size:
+            exchange_len, routing_len, body_len = FRAME_HEADER.unpack_from(view, offset)
+            start = offset + FRAME_HEADER.size
+            end = start + exchange_len + routing_len + body_len
+            if end > len(view):
+                break
+            exchange = str(view[start:start + exchange_len], 'utf-8')
+            routing_key = str(view[start + exchange_len:start + exchange_len + routing_len], 'utf-8')
+            body = bytes(view[start + exchange_len + routing_len:end])
+            offset = end
+            if self._consumer is not None:
+                method = SimpleNamespace(exchange=exchange, routing_key=routing_key)
+                self._consumer(self._channel, method, None, body)
+        view.release()
+        del self._buffer[:offset]
+
+    def close(self):
+        """
+        Close the connection to the relay
+        """
+        self.sock.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+
+class RelayChannel:
+    """
+    Channel of a local subscriber: bindings are forwarded to the relay
+    """
+
+    def __init__(self, connection: RelayConnection):
+        """
+        Constructor
+        """
+        self.connection = connection
+
+    def exchange_declare(self, exchange, exchange_type, durable=False):
+        """
+        Exchanges are declared by the relay
+        """
+
+    def queue_declare(self, queue='', exclusive=False):
+        """
+        The queue is the one of the relay
+        """
+        return SimpleNamespace(method=SimpleNamespace(queue="relay"))
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False):
+        """
+        Register the callback called for each news received from the relay
+        """
+        self.connection._consumer = on_message_callback
+
+    def queue_bind(self, exchange, queue, routing_key=""):
+        """
+        Ask the relay to forward the news of the binding
+        """
+        self.connection.sock.sendall(f"bind {exchange} {routing_key}\n".encode('utf-8'))
+
+    def queue_unbind(self, exchange, queue, routing_key=""):
+        """
+        Ask the relay to stop forwarding the news of the binding
+        """
+        self.connection.sock.sendall(f"unbind {exchange} {routing_key}\n".encode('utf-8'))
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+import logging
+import sys
+import getpass
+
+from relay import Relay
+import constants
+
+def main():
+    """
+    Main program entry point.
+    """
+    logging.basicConfig(stream=sys.stderr,
+                        level=logging.INFO,
+                        format="[%(levelname)s] %(threadName)s \t\t %(message)s")
+    logging.getLogger("pika").setLevel(logging.WARNING)
+
+    # 1) Local socket shared with the subscribers of the host
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else constants.RELAY_SOCKET_PATH
+
+    # 2) RabbitMQ authentication – retry up to three times
+    MAX_TRIES = 3
+    for attempt in range(1, MAX_TRIES + 1):
+        username = input("Enter your RabbitMQ username: ").strip()
+        password = getpass.getpass("Enter your RabbitMQ password: ")
+
+        relay = Relay(username=username,
+                      password=password,
+                      socket_path=socket_path)
+        relay.name = "Relay"
+        relay.start()
+        try:
+            relay.join()                 # thread quits fast on auth failure
+        except KeyboardInterrupt:
+            relay.exit()
+            relay.join()
+            break
+
+        if relay.is_alive():             # connected → keep thread running
+            break
+
+        if attempt < MAX_TRIES:
+            print(f"Authentication failed ({attempt}/{MAX_TRIES}). Try again.\n")
+        else:
+            print("Too many failed attempts—good-bye.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+"""
+Routing rules of the exchanges, shared by the clients
+"""
+
+
+def matches_pattern(pattern: str, routing_key: str, exchange_type: str = 'topic') -> bool:
+    """
+    Check if a routing key matches a binding pattern with wildcards.
+    RabbitMQ wildcards:
+    * (star) matches exactly one word
+    # (hash) matches zero or more words
+
+    :param pattern: The routing key of the binding
+    :param routing_key: The routing key of the message
+    :param exchange_type: The type of the exchange. A fanout exchange ignores the routing key
+    """
+    if exchange_type == 'fanout':
+        return True
+    pattern_parts = pattern.split('.')
+    key_parts = routing_key.split('.')
+
+    i = j = 0
+    while i < len(pattern_parts) and j < len(key_parts):
+        if pattern_parts[i] == '#':
+            return True  # '#' matches the rest
+        elif pattern_parts[i] == '*':
+            i += 1
+            j += 1
+        elif pattern_parts[i] == key_parts[j]:
+            i += 1
+            j += 1
+        else:
+            return False
+
+    # Handle remaining parts
+    if i < len(pattern_parts) and pattern_parts[i] == '#':
+        i += 1
+
+    return i == len(pattern_parts) and j == len(key_parts)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+"""
+Manage the on-disk snapshot of a subscriber state
+"""
+
+import fcntl
+import json
+import logging
+import mmap
+import os
+from collections import deque
+import constants
+
+# Records kept in the journal before it is compacted, on top of the state size
+COMPACT_MIN_RECORDS = 1000
+
+PRIORITIES = (constants.PRIORITY_LOW, constants.PRIORITY_MEDIUM, constants.PRIORITY_HIGH)
+
+
+def _is_text(value) -> bool:
+    """
+    Check that a record argument is a text
+    """
+    return isinstance(value, str)
+
+
+def _is_priority(value) -> bool:
+    """
+    Check that a record argument is a priority level
+    """
+    return value in PRIORITIES
+
+
+# Checks of the arguments of each record action
+RECORD_ARGS = {
+    "subscribe": (_is_text, _is_priority),
+    "unsubscribe": (_is_text,),
+    "show": (_is_priority,),
+    "online": (_is_text,),
+    "offline": (_is_text,),
+    "message": (_is_priority, _is_text),
+}
+
+
+class Snapshot:
+    """
+    Append-only journal of the changes of a subscriber state (subscriptions,
+    priority shown, online editors and received news). Changes are buffered
+    in memory and appended on flush; the journal is rewritten from the current
+    state when it grows too much. Only the last SNAPSHOT_MAX_MESSAGES news of
+    each priority are kept. The journal is locked while in use, so that two
+    subscribers with the same name do not write to it.
+
+    One JSON record per line:
+      ["subscribe", <routing>, <priority>]
+      ["unsubscribe", <routing>]
+      ["show", <priority>]
+      ["online", <editor>]
+      ["offline", <editor>]
+      ["message", <priority>, <text>]
+    """
+
+    def __init__(self, path: str):
+        """
+        Constructor
+
+        :param path: The journal file path
+        :raises RuntimeError: If the journal is used by another process
+        """
+        self.path = path
+        self._records = []  # records not written yet
+        self._written = 0  # number of records in the journal file
+        self._compact_next = False  # rewrite the journal on the next flush (after a failed append)
+
+        # The lock is taken on a sibling file: compaction replaces the journal file itself
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(f"{path}.lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"❌ Snapshot {path} is used by another subscriber with the same name.")
+
+    def close(self):
+        """
+        Release the journal for another process
+        """
+        self._lock_file.close()
+
+    def load(self) -> dict:
+        """
+        Replay the journal file and return the state it describes
+        """
+        state = {
+            "subscriptions": {},
+            "current_priority": constants.PRIORITY_HIGH,
+            "online_editors": set(),
+            "messages": {
+                constants.PRIORITY_LOW: deque(maxlen=constants.SNAPSHOT_MAX_MESSAGES),
+                constants.PRIORITY_MEDIUM: deque(maxlen=constants.SNAPSHOT_MAX_MESSAGES),
+                constants.PRIORITY_HIGH: deque(maxlen=constants.SNAPSHOT_MAX_MESSAGES)
+            }
+        }
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            self.__replay(state)
+        state["messages"] = {priority: list(messages) for priority, messages in state["messages"].items()}
+        return state
+
+    def __replay(self, state: dict):
+        """
+        Apply the records of the journal file to the state
+        """
+        valid_size = 0  # size of the journal up to the last complete record
+        with open(self.path, "rb") as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as journal:
+            for line in iter(journal.readline, b""):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n") or not self.__is_valid(record):
+                    break
+                self.__apply(state, record)
+                self._written += 1
+                valid_size = journal.tell()
+            size = len(journal)
+        if valid_size < size:
+            # Interrupted write or invalid record: drop it and what follows so the next records are appended after a complete line
+            logging.warning(f"⚠️ Snapshot {self.path} truncated; keeping the state read so far.")
+            os.truncate(self.path, valid_size)
+
+    def __is_valid(self, record) -> bool:
+        """
+        Check that a record read from the journal has a known action and valid arguments
+        """
+        if not isinstance(record, list) or not record or not _is_text(record[0]) or record[0] not in RECORD_ARGS:
+            return False
+        checks = RECORD_ARGS[record[0]]
+        return len(record) == len(checks) + 1 and all(check(arg) for check, arg in zip(checks, record[1:]))
+
+    def __apply(self, state: dict, record: list):
+        """
+        Apply a journal record to the state
+        """
+        action = record[0]
+        if action == "subscribe":
+            state["subscriptions"][record[1]] = record[2]
+        elif action == "unsubscribe":
+            state["subscriptions"].pop(record[1], None)
+        elif action == "show":
+            state["current_priority"] = record[1]
+        elif action == "online":
+            state["online_editors"].add(record[1])
+        elif action == "offline":
+            state["online_editors"].discard(record[1])
+        elif action == "message":
+            state["messages"][record[1]].append(record[2])
+
+    def record(self, *record):
+        """
+        Buffer a change of the state until the next flush
+
+        :param record: The action followed by its arguments
+        """
+        self._records.append(record)
+
+    def flush(self, state: dict):
+        """
+        Append the buffered changes to the journal, or rewrite the journal
+        from the state when it holds too many outdated records.
+
+        :param state: The current state, same shape as returned by load()
+        """
+        if not self._records:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        state_size = (len(state["subscriptions"]) + len(state["online_editors"]) + 1
+                      + sum(min(len(messages), constants.SNAPSHOT_MAX_MESSAGES)
+                            for messages in state["messages"].values()))
+        if self._compact_next or self._written + len(self._records) > 2 * state_size + COMPACT_MIN_RECORDS:
+            self.__compact(state)
+        else:
+            self.__append()
+        self._records.clear()
+
+    def __append(self):
+        """
+        Append the buffered records to the journal. On failure, the journal is
+        cut back to its previous size so that no partial record remains.
+        """
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        try:
+            with open(self.path, "a", encoding="utf-8") as journal:
+                journal.writelines(json.dumps(record) + "\n" for record in self._records)
+        except OSError:
+            try:
+                os.truncate(self.path, size)
+            except OSError:
+                self._compact_next = True  # the journal may end with a partial record
+            raise
+        self._written += len(self._records)
+
+    def __compact(self, state: dict):
+        """
+        Rewrite the journal with the minimal records describing the state
+        """
+        records = [("subscribe", routing, priority) for routing, priority in state["subscriptions"].items()]
+        records.append(("show", state["current_priority"]))
+        records += [("online", editor) for editor in state["online_editors"]]
+        for priority, messages in state["messages"].items():
+            records += [("message", priority, text) for text in messages[-constants.SNAPSHOT_MAX_MESSAGES:]]
+
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as journal:
+            journal.writelines(json.dumps(record) + "\n" for record in records)
+        os.replace(temp_path, self.path)  # atomic: the previous journal stays valid until then
+        self._written = len(records)
+        self._compact_next = False
+        logging.debug(f"Snapshot {self.path} compacted to {len(records)} records.")
@@ -6,12 +6,17 @@ Manage the news subscriber
 
 import logging
 import threading
+import queue
 import pika
 import time
 import re
-import ssl
+from collections import deque
 import pika.exceptions
 import constants
+from connection import tls_connector
+from relay import RelayConnection
+from snapshot import Snapshot
+from routing import matches_pattern
 for name in list(logging.root.manager.loggerDict):
     if name.startswith("pika"):
         pika_log = logging.getLogger(name)
@@ -24,13 +29,26 @@ class Subscriber(threading.Thread):
     A subscriber can subscribe to editors, news types, and receive news
     """
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, relay_path=None, snapshot_path=None,
+                 connect=None, interactive=True, on_news=None):
         """
         Constructor
+
+        :param relay_path: Unix socket of the local relay. Connect directly to the broker if None
+        :param snapshot_path: File where the state is saved and restored from. No snapshot if None
+        :param connect: Function opening a connection to a node from its index. TLS connection if None
+        :param interactive: Read the commands from the user if True
+        :param on_news: Function called with the exchange, routing key and message of each news kept
+        :raises RuntimeError: If the snapshot is used by another subscriber
         """
         super(Subscriber, self).__init__()  # execute super class constructor
         self.username = username
         self.password = password
+        self.connect = connect if connect is not None else tls_connector(username, password)
+        self.interactive = interactive
+        self.on_news = on_news
+        self.connection = None  # connection to the broker (or relay). Defined later
+        self.relay_path = relay_path
         self.running = True  # flag to indicate if the subscriber is running
         self.queue_name = None  # name of the queue. Defined later
         self.map_news_routing_priory = {} # map to store the routing keys and their priorities
@@ -41,6 +59,9 @@ class Subscriber(threading.Thread):
         } # list to store messages received
         self.current_priority = constants.PRIORITY_HIGH # current priority level to show
         self.online_editors = set() # set to store online editors
+        self._commands = queue.SimpleQueue() # commands sent by the CLI thread to the connection thread
+        self._pending_commands = deque() # commands taken from the queue but not applied yet
+        self.snapshot = Snapshot(snapshot_path) if snapshot_path is not None else None # journal of the state
 
     # ──────────────────────────────────────────────────────────
     # main thread life-cycle
@@ -49,21 +70,30 @@ class Subscriber(threading.Thread):
         """
         Handle the lifecycle of the subscriber
         """
+        # 0) Restore the state saved by the previous run, rebound on connect
+        if self.snapshot is not None:
+            self.__restore_snapshot()
+
         # 1) Connect to the broker
         try:
             self.__connect()
         except ConnectionError as err:          # e.g. wrong password on both nodes
             logging.error(err)
-            logging.error("❌ Authentication failed — subscriber will exit.")
+            if self.relay_path is None:
+                logging.error("❌ Authentication failed — subscriber will exit.")
+            if self.snapshot is not None:
+                self.snapshot.close()
             return
         # 2) Always listen to editor announcements
-        self.__add_subscription(exchange=constants.EDITORS_EXCHANGE_NAME)
+        if "" not in self.map_news_routing_priory:
+            self.__add_subscription(exchange=constants.EDITORS_EXCHANGE_NAME)
 
         # 3) Start the CLI command listener in a helper thread
-        command_thread = threading.Thread(target=self.__listen_for_commands,
-                                          daemon=True,
-                                          name="CommandListener")
-        command_thread.start()
+        if self.interactive:
+            command_thread = threading.Thread(target=self.__listen_for_commands,
+                                              daemon=True,
+                                              name="CommandListener")
+            command_thread.start()
 
         # 4) Enter the main receive loop
         self.__wait_for_news()
@@ -75,53 +105,25 @@ class Subscriber(threading.Thread):
         """
         Connect to broker with TLS, authenticate, declare exchanges,
         declare queue and (re)bind any existing subscriptions.
+        When a local relay is used, connect to it instead of the broker.
         """
-        # TLS setup
-        context = ssl.create_default_context(cafile=constants.CA_CERT_FILE)
-        context.load_cert_chain(constants.CLIENT_CERT_FILE,
-                                constants.CLIENT_KEY_FILE)
-        creds = pika.PlainCredentials(self.username, self.password)
+        if self.relay_path is not None:
+            try:
+                self.connection = RelayConnection(self.relay_path)
+            except OSError as e:
+                raise ConnectionError(f"❌ Local relay unreachable at {self.relay_path}: {e!r}")
+            self.channel = self.connection.channel()
+            logging.info(f"✅ Connected to local relay at {self.relay_path}")
+            self.__setup_queue()
+            return
 
         last_exc = None
-        for host, port in constants.RABBITMQ_NODES:
+        for node, (host, port) in enumerate(constants.RABBITMQ_NODES):
             try:
-                params = pika.ConnectionParameters(
-                    host=host,
-                    port=port,
-                    virtual_host=constants.RABBITMQ_VHOST,
-                    credentials=creds,
-                    ssl_options=pika.SSLOptions(context),
-                    connection_attempts=3,
-                    retry_delay=2
-                )
-                self.connection = pika.BlockingConnection(params)
+                self.connection = self.connect(node)
                 self.channel = self.connection.channel()
                 logging.info(f"✅ Connected to RabbitMQ at {host}:{port}")
-
-                # Declare the two exchanges (fanout & topic)
-                self.channel.exchange_declare(
-                    exchange=constants.EDITORS_EXCHANGE_NAME,
-                    exchange_type='fanout',
-                    durable=True
-                )
-                self.channel.exchange_declare(
-                    exchange=constants.NEWS_EXCHANGE_NAME,
-                    exchange_type='topic',
-                    durable=True
-                )
-
-                # Declare exclusive, auto-delete queue and start consuming
-                qr = self.channel.queue_declare(queue='', exclusive=True)
-                self.queue_name = qr.method.queue
-                self.channel.basic_consume(
-                    queue=self.queue_name,
-                    on_message_callback=self.__callback,
-                    auto_ack=True
-                )
-                logging.info(f"Subscriber queue '{self.queue_name}' declared")
-
-                # Rebind any prior subscriptions (on reconnect)
-                self.__rebind_subscriptions()
+                self.__setup_queue()
                 return
 
             except Exception as e:
@@ -134,6 +136,38 @@ class Subscriber(threading.Thread):
 
         raise ConnectionError(f"❌ All connection attempts failed: {last_exc!r}")
 
+    def __setup_queue(self):
+        """
+        Declare exchanges, declare queue and (re)bind any existing subscriptions
+        on the freshly opened channel.
+        """
+        # Declare the two exchanges (fanout & topic)
+        self.channel.exchange_declare(
+            exchange=constants.EDITORS_EXCHANGE_NAME,
+            exchange_type='fanout',
+            durable=True
+        )
+        self.channel.exchange_declare(
+            exchange=constants.NEWS_EXCHANGE_NAME,
+            exchange_type='topic',
+            durable=True
+        )
+
+        # Declare exclusive, auto-delete queue and start consuming
+        qr = self.channel.queue_declare(queue='', exclusive=True)
+        self.queue_name = qr.method.queue
+        self.channel.basic_consume(
+            queue=self.queue_name,
+            on_message_callback=self.__callback,
+            auto_ack=True
+        )
+        logging.info(f"Subscriber queue '{self.queue_name}' declared")
+
+        # Rebind any prior subscriptions (on reconnect)
+        self.__rebind_subscriptions()
+        # Apply the commands received while the connection was down
+        self.__process_commands()
+
     def __rebind_subscriptions(self):
         """
         After reconnect, re-bind the queue to all exchanges
@@ -157,9 +191,11 @@ class Subscriber(threading.Thread):
         Main loop: process events and handle forced shutdowns by reconnecting.
         """
         logging.info(f"🚀 Waiting for news (showing '{self.current_priority}' priority)...")
+        last_snapshot = time.monotonic()
         while self.running:
             try:
-                self.connection.process_data_events()
+                # Wait for news at most 0.1 s; a command handed over or a news received ends the wait at once
+                self.connection.process_data_events(time_limit=0.1)
             except Exception as e:   # ← catch everything, no traceback
                 logging.warning(f"⚠️ Lost connection ({e.__class__.__name__}) — reconnecting…")
                 try:
@@ -169,7 +205,13 @@ class Subscriber(threading.Thread):
                     logging.warning("⚠️ Reconnect attempt failed; will retry shortly.")
                     time.sleep(2)
                     continue
-            time.sleep(0.1)
+            # Save the state changes periodically
+            if self.snapshot is not None and time.monotonic() - last_snapshot >= constants.SNAPSHOT_INTERVAL:
+                self.__save_snapshot()
+                last_snapshot = time.monotonic()
+        if self.snapshot is not None:
+            self.__save_snapshot()
+            self.snapshot.close()
         self.connection.close()
 
     def __add_subscription(self, exchange: str, routing: str = "", priority: str = constants.PRIORITY_HIGH):
@@ -181,8 +223,7 @@ class Subscriber(threading.Thread):
         :param priority: The priority of the subscription. Default is constants.PRIORITY_HIGH
         """
         # Check if priority is valid
-        if priority not in [constants.PRIORITY_LOW, constants.PRIORITY_MEDIUM, constants.PRIORITY_HIGH]:
-            logging.error(f"⚡️ Invalid priority: {priority}. Must be one of \"{constants.PRIORITY_LOW}\", \"{constants.PRIORITY_MEDIUM}\", \"{constants.PRIORITY_HIGH}\".")
+        if not self.__is_valid_priority(priority):
             return
 
         # Check if not already subscribed
@@ -193,6 +234,7 @@ class Subscriber(threading.Thread):
                 return
             else:
                 self.map_news_routing_priory[routing] = priority
+                self.__record("subscribe", routing, priority)
                 logging.warning(f"✅ Changed priority of subscription to {routingKeyFormatted} to to \"{priority}\".")
                 return
 
@@ -205,6 +247,7 @@ class Subscriber(threading.Thread):
 
         # Store the mapping of exchange to queue
         self.map_news_routing_priory[routing] = priority
+        self.__record("subscribe", routing, priority)
         logging.info(f"✅ Subscribed to {exchange} with routing key {routingKeyFormatted} and {priority} priority.")
 
     def __remove_subscription(self, exchange: str, routing: str):
@@ -218,19 +261,14 @@ class Subscriber(threading.Thread):
         if routing in self.map_news_routing_priory:
             self.channel.queue_unbind(exchange=exchange, queue=self.queue_name, routing_key=routing)
             del self.map_news_routing_priory[routing]
+            self.__record("unsubscribe", routing)
             logging.info(f"💢 Unsubscribed from {routingKeyFormatted}.")
         else:
             logging.warning(f"⚡️ Not subscribed to {routingKeyFormatted}.")
 
     def __listen_for_commands(self):
         """
-        A thread that listens for user commands:
-          - subscribe <topic> [<priority_level_name>]
-          - unsubscribe <topic> [<priority_level_name>]
-          - subscribeeditor <editorName>
-          - unsubscribeeditor <editorName>
-          - showPriority <priority_level_name>
-          - exit
+        A thread that listens for user commands (see handle_command)
         """
         print("Commands available:")
         print("- subscribe <topic> [<low/medium/high>]")
@@ -243,61 +281,154 @@ class Subscriber(threading.Thread):
         while self.running:
             try:
                 # Get the command from the user
-                cmd = input(">> ").strip()
-                args = cmd.split(" ")
-                # Skip if the command is empty
-                if cmd == "":
-                    continue
-                # Exit the system if the command is "exit"
-                if cmd == "exit":
-                    self.exit()
-                    break
-                # Handle subscribe/unsubscribe commands
-                elif len(args) > 1:
-                    # Get the topic or editor name
-                    parameter = args[1]
-                    # Get the priority if provided
-                    priority = constants.PRIORITY_HIGH
-                    if len(args) > 2:
-                        priority = args[2]
-                    if cmd.startswith("subscribe "):
-                        # ex: subscribe weather
-                        typeToCheck = parameter.split('.')[0]
-                        if typeToCheck not in constants.NEWS_TYPES:
-                            logging.error(f"⚡️ Invalid news type: {parameter}")
-                            continue
-                        self.__add_subscription(exchange=constants.NEWS_EXCHANGE_NAME, routing=f"*.{parameter}.#", priority=priority)
-                    elif cmd.startswith("unsubscribe "):
-                        # ex: unsubscribe weather
-                        self.__remove_subscription(exchange=constants.NEWS_EXCHANGE_NAME, routing=f"*.{parameter}.#")
-
-                    elif cmd.startswith("subscribeeditor "):
-                        # ex: subscribeeditor Bob
-                        self.__add_subscription(exchange=constants.NEWS_EXCHANGE_NAME, routing=f"{parameter}.#", priority=priority)
-                    elif cmd.startswith("unsubscribeeditor "):
-                        # ex: unsubscribeeditor Bob
-                        self.__remove_subscription(exchange=constants.NEWS_EXCHANGE_NAME, routing=f"{parameter}.#")
-
-                    elif cmd.startswith("showPriority "):
-                        priority = args[1]
-                        # ex: showPriority high
-                        if priority in [constants.PRIORITY_LOW, constants.PRIORITY_MEDIUM, constants.PRIORITY_HIGH]:
-                            self.current_priority = priority
-                            logging.info(f"🚩 Showing only news with priority \"{priority}\".")
-                            if (self.messages[priority] != []):
-                                logging.info(f"🏛️ News with priority \"{priority}\":")
-                                for message in self.messages[priority]:
-                                    logging.info(f"- {message}")
-                        else:
-                            logging.error(f"⚡️ Invalid priority: {priority}. Must be one of \"{constants.PRIORITY_LOW}\", \"{constants.PRIORITY_MEDIUM}\", \"{constants.PRIORITY_HIGH}\".")
-                    else:
-                        logging.error(f"⚡️ Invalid command: {cmd}")
-                else:
-                    logging.error(f"⚡️ Invalid command: {cmd}")
-                
+                self.handle_command(input(">> "))
             except EOFError:
                 break
 
+    def handle_command(self, cmd: str):
+        """
+        Handle a user command:
+          - subscribe <topic> [<priority_level_name>]
+          - unsubscribe <topic> [<priority_level_name>]
+          - subscribeeditor <editorName>
+          - unsubscribeeditor <editorName>
+          - showPriority <priority_level_name>
+          - exit
+
+        pika's BlockingConnection is not thread-safe: the commands are only
+        parsed here and handed over to the connection thread, which applies them.
+        Can be called from any thread.
+
+        :param cmd: The command line
+        """
+        cmd = cmd.strip()
+        args = cmd.split(" ")
+        # Skip if the command is empty
+        if cmd == "":
+            return
+        # Exit the system if the command is "exit"
+        if cmd == "exit":
+            self.exit()
+        # Handle subscribe/unsubscribe commands
+        elif len(args) > 1:
+            # Get the topic or editor name
+            parameter = args[1]
+            # Get the priority if provided
+            priority = constants.PRIORITY_HIGH
+            if len(args) > 2:
+                priority = args[2]
+            if cmd.startswith("subscribe "):
+                # ex: subscribe weather
+                typeToCheck = parameter.split('.')[0]
+                if typeToCheck not in constants.NEWS_TYPES:
+                    logging.error(f"⚡️ Invalid news type: {parameter}")
+                    return
+                if not self.__is_valid_priority(priority):
+                    return
+                self.__send_command("subscribe", constants.NEWS_EXCHANGE_NAME, f"*.{parameter}.#", priority)
+            elif cmd.startswith("unsubscribe "):
+                # ex: unsubscribe weather
+                self.__send_command("unsubscribe", constants.NEWS_EXCHANGE_NAME, f"*.{parameter}.#")
+
+            elif cmd.startswith("subscribeeditor "):
+                # ex: subscribeeditor Bob
+                if not self.__is_valid_priority(priority):
+                    return
+                self.__send_command("subscribe", constants.NEWS_EXCHANGE_NAME, f"{parameter}.#", priority)
+            elif cmd.startswith("unsubscribeeditor "):
+                # ex: unsubscribeeditor Bob
+                self.__send_command("unsubscribe", constants.NEWS_EXCHANGE_NAME, f"{parameter}.#")
+
+            elif cmd.startswith("showPriority "):
+                priority = args[1]
+                # ex: showPriority high
+                if self.__is_valid_priority(priority):
+                    self.__send_command("showPriority", priority=priority)
+            else:
+                logging.error(f"⚡️ Invalid command: {cmd}")
+        else:
+            logging.error(f"⚡️ Invalid command: {cmd}")
+
+    # ──────────────────────────────────────────────────────────
+    # commands hand-over (CLI thread → connection thread)
+    # ──────────────────────────────────────────────────────────
+    def __send_command(self, action: str, exchange: str = "", routing: str = "", priority: str = constants.PRIORITY_HIGH):
+        """
+        Queue a command and wake up the connection thread to apply it.
+
+        :param action: "subscribe", "unsubscribe" or "showPriority"
+        :param exchange: The exchange name of the subscription
+        :param routing: The routing key of the subscription
+        :param priority: The priority of the subscription or the priority to show
+        """
+        self._commands.put((action, exchange, routing, priority))
+        try:
+            self.connection.add_callback_threadsafe(self.__process_commands)
+        except Exception as e:
+            # Connection is down: the command is applied after the reconnection
+            logging.debug(f"Command \"{action}\" deferred ({e.__class__.__name__}).")
+
+    def __process_commands(self):
+        """
+        Apply the pending commands. Runs on the connection thread only, so the
+        channel and the subscriptions map are never touched concurrently.
+
+        Commands are applied in batch: only the last subscribe/unsubscribe of
+        each routing key is kept, so bursts of changes cost one bind at most.
+        If the connection drops in the middle of the batch, the remaining
+        commands stay pending and are applied after the reconnection.
+        """
+        while True:
+            try:
+                self._pending_commands.append(self._commands.get_nowait())
+            except queue.Empty:
+                break
+        if not self._pending_commands:
+            return
+
+        # Keep only the latest change of each routing key
+        latest = {}
+        for index, (action, _, routing, _) in enumerate(self._pending_commands):
+            if action != "showPriority":
+                latest[routing] = index
+        self._pending_commands = deque(
+            command for index, command in enumerate(self._pending_commands)
+            if command[0] == "showPriority" or latest[command[2]] == index
+        )
+
+        while self._pending_commands:
+            action, exchange, routing, priority = self._pending_commands[0]  # peek
+            if action == "subscribe":
+                self.__add_subscription(exchange=exchange, routing=routing, priority=priority)
+            elif action == "unsubscribe":
+                self.__remove_subscription(exchange=exchange, routing=routing)
+            else:
+                self.__show_priority(priority)
+            self._pending_commands.popleft()  # applied → drop
+
+    def __show_priority(self, priority: str):
+        """
+        Change the priority level to show and print the news already received with it
+
+        :param priority: The priority level to show
+        """
+        self.current_priority = priority
+        self.__record("show", priority)
+        logging.info(f"🚩 Showing only news with priority \"{priority}\".")
+        if (self.messages[priority] != []):
+            logging.info(f"🏛️ News with priority \"{priority}\":")
+            for message in self.messages[priority]:
+                logging.info(f"- {message}")
+
+    def __is_valid_priority(self, priority: str) -> bool:
+        """
+        Check if the priority is valid and log an error if not
+        """
+        if priority in [constants.PRIORITY_LOW, constants.PRIORITY_MEDIUM, constants.PRIORITY_HIGH]:
+            return True
+        logging.error(f"⚡️ Invalid priority: {priority}. Must be one of \"{constants.PRIORITY_LOW}\", \"{constants.PRIORITY_MEDIUM}\", \"{constants.PRIORITY_HIGH}\".")
+        return False
+
     def __callback(self, ch, method, properties, body):
         """
         Callback function that is called when a new message is received
@@ -317,7 +448,7 @@ class Subscriber(threading.Thread):
         routingKeyFormatted = self.__format_routing_key(routing_key)
         priority = None
         for pattern, p in self.map_news_routing_priory.items():
-            if self.__matches_pattern(pattern, routing_key):
+            if matches_pattern(pattern, routing_key):
                 priority = p
                 logging.debug(f"Found priority \"{priority}\" for routing key \"{routingKeyFormatted}\".")
                 break
@@ -332,39 +463,15 @@ class Subscriber(threading.Thread):
 
         # Store the received message in the appropriate priority list
         self.messages[priority].append(text)
+        self.__record("message", priority, text)
 
         # Manage message received from the editor exchange
         if exchange_name == constants.EDITORS_EXCHANGE_NAME:
             self.__handle_editor_announcement(message, priority=priority)
 
-    def __matches_pattern(self, pattern: str, routing_key: str) -> bool:
-        """
-        Check if a routing key matches a pattern with wildcards.
-        RabbitMQ wildcards:
-        * (star) matches exactly one word
-        # (hash) matches zero or more words
-        """
-        pattern_parts = pattern.split('.')
-        key_parts = routing_key.split('.')
-
-        i = j = 0
-        while i < len(pattern_parts) and j < len(key_parts):
-            if pattern_parts[i] == '#':
-                return True  # '#' matches the rest
-            elif pattern_parts[i] == '*':
-                i += 1
-                j += 1
-            elif pattern_parts[i] == key_parts[j]:
-                i += 1
-                j += 1
-            else:
-                return False
-
-        # Handle remaining parts
-        if i < len(pattern_parts) and pattern_parts[i] == '#':
-            i += 1
-
-        return i == len(pattern_parts) and j == len(key_parts)
+        # Notify the observer, if any (e.g. the load tests)
+        if self.on_news is not None:
+            self.on_news(exchange_name, routing_key, message)
 
     def __handle_editor_announcement(self, announcement: str, priority: str):
         """
@@ -384,16 +491,57 @@ class Subscriber(threading.Thread):
             text = ""
             if status == "online":
                 self.online_editors.add(editor_name)
+                self.__record("online", editor_name)
                 text = f"✨ Editor {editor_name} added to online list."
             else:
                 # offline
                 if editor_name in self.online_editors:
                     self.online_editors.remove(editor_name)
+                    self.__record("offline", editor_name)
                     text = f"🛑 Editor {editor_name} removed from online list."
             if text != "":
                 self.messages[priority].append(text)
+                self.__record("message", priority, text)
                 logging.info(text)
 
+    # ──────────────────────────────────────────────────────────
+    # snapshot (connection thread)
+    # ──────────────────────────────────────────────────────────
+    def __restore_snapshot(self):
+        """
+        Restore the state saved by the previous run. The subscriptions are
+        bound in one pass by __rebind_subscriptions once connected.
+        """
+        state = self.snapshot.load()
+        self.map_news_routing_priory = state["subscriptions"]
+        self.current_priority = state["current_priority"]
+        self.online_editors = state["online_editors"]
+        self.messages = state["messages"]
+        if self.map_news_routing_priory:
+            count = sum(len(messages) for messages in self.messages.values())
+            logging.info(f"♻️ Restored {len(self.map_news_routing_priory)} subscription(s) and {count} news from {self.snapshot.path}.")
+
+    def __save_snapshot(self):
+        """
+        Write the state changes since the last save
+        """
+        try:
+            self.snapshot.flush({
+                "subscriptions": self.map_news_routing_priory,
+                "current_priority": self.current_priority,
+                "online_editors": self.online_editors,
+                "messages": self.messages
+            })
+        except OSError as e:
+            logging.warning(f"⚠️ Could not save snapshot ({e.__class__.__name__}); will retry.")
+
+    def __record(self, *record):
+        """
+        Record a state change in the snapshot, if any
+        """
+        if self.snapshot is not None:
+            self.snapshot.record(*record)
+
     def __format_routing_key(self, routing_key: str) -> str:
         """
         Format the routing key to better readability in the logs
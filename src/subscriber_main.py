@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 import logging
+import os
+import re
 import sys
 import getpass
 
@@ -17,20 +19,45 @@ def main():
 
     # 1) Subscriber name
     name = ""
-    while not name.strip():
+    while not name.strip() or name.strip().startswith("."):
         name = input("Enter your name: ")
         if not name.strip():
             print("⚠️  Name cannot be empty.")
+        elif name.strip().startswith("."):
+            print("⚠️  Name cannot start with \".\".")
+    # State saved across restarts, one file per subscriber name (kept inside SNAPSHOT_DIR)
+    snapshot_name = re.sub(r'[^\w.-]', '_', name.strip())
+    snapshot_path = os.path.join(constants.SNAPSHOT_DIR, f"{snapshot_name}.snap")
 
-    # 2) RabbitMQ credentials
-    # 2) RabbitMQ authentication – retry up to three times
+    # 2) Local relay (optional): `subscriber_main.py --relay [<socket_path>]`
+    if len(sys.argv) > 1 and sys.argv[1] == "--relay":
+        relay_path = sys.argv[2] if len(sys.argv) > 2 else constants.RELAY_SOCKET_PATH
+        try:
+            subscriber = Subscriber(username=None,
+                                    password=None,
+                                    relay_path=relay_path,
+                                    snapshot_path=snapshot_path)
+        except RuntimeError as err:      # snapshot locked by a subscriber with the same name
+            print(err)
+            sys.exit(1)
+        subscriber.name = f'Subscriber "{name}"'
+        subscriber.start()
+        subscriber.join()
+        return
+
+    # 3) RabbitMQ authentication – retry up to three times
     MAX_TRIES = 3
     for attempt in range(1, MAX_TRIES + 1):
         username = input("Enter your RabbitMQ username: ").strip()
         password = getpass.getpass("Enter your RabbitMQ password: ")
 
-        subscriber = Subscriber(username=username,
-                                password=password)
+        try:
+            subscriber = Subscriber(username=username,
+                                    password=password,
+                                    snapshot_path=snapshot_path)
+        except RuntimeError as err:      # snapshot locked by a subscriber with the same name
+            print(err)
+            sys.exit(1)
         subscriber.name = f'Subscriber "{name}"'
         subscriber.start()
         subscriber.join()                # thread quits fast on auth failure